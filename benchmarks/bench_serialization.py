@@ -0,0 +1,104 @@
+"""
+Per-request CPU spent on (de)serialization by /ask, old path vs current one,
+for request bodies from 1 KB to 1 MB. No network, no upstream call.
+
+    python benchmarks/bench_serialization.py
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from ooo_llm_bridge import serialization  # noqa: E402
+from ooo_llm_bridge.config import DATA_DIR  # noqa: E402
+from ooo_llm_bridge.models.message import ChatRequest, ChatResponse  # noqa: E402
+from ooo_llm_bridge.review import build_messages, load_review_context  # noqa: E402
+from ooo_llm_bridge.serialization import FastJSONResponse  # noqa: E402
+
+CONTEXT = load_review_context(
+    DATA_DIR / "full_context.json", DATA_DIR / "prompts" / "system.txt"
+)
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+SENTENCE = (
+    "Il sole era appena calato dietro le mura di Guardiavecchia, e l’ombra saliva. "
+)
+
+
+def make_body(size: int) -> bytes:
+    text = (SENTENCE * (size // len(SENTENCE) + 1))[:size]
+    threads = [
+        {
+            "thread_id": f"TR-{i}",
+            "anchor_snippet": SENTENCE,
+            "annotations": [
+                {
+                    "author": "Autore",
+                    "datetime": "2025-11-20T10:00:00",
+                    "content": "Va bene così?",
+                }
+            ]
+            * 2,
+        }
+        for i in range(5)
+    ]
+    return json.dumps(
+        {"text": text, "uuid": "uuid1", "comment_threads": threads}
+    ).encode()
+
+
+def old_path(body: bytes, reply: str) -> bytes:
+    # come prima: FastAPI json.loads + validazione, JSON dentro JSON per i
+    # thread, dict di risposta validato e ri-serializzato da FastAPI
+    chat_request = ChatRequest.model_validate(json.loads(body))
+    user_payload = {
+        "editorial_context": CONTEXT.editorial_context,
+        "section_text": chat_request.text,
+        "comment_threads": [c.model_dump_json() for c in chat_request.comment_threads],
+    }
+    json.dumps(user_payload, ensure_ascii=False)
+    response = ChatResponse.model_validate({"reply": reply})
+    return JSONResponse(jsonable_encoder(response)).body
+
+
+def new_path(body: bytes, reply: str) -> bytes:
+    chat_request = ChatRequest.model_validate_json(body)
+    build_messages(CONTEXT, chat_request)
+    return FastJSONResponse({"reply": reply}).body
+
+
+def measure(fn, body: bytes, reply: str, budget: float = 0.5) -> float:
+    """Returns CPU seconds per call."""
+    fn(body, reply)
+    n, start = 0, time.process_time()
+    while True:
+        fn(body, reply)
+        n += 1
+        elapsed = time.process_time() - start
+        if elapsed >= budget:
+            return elapsed / n
+
+
+def main() -> None:
+    json_lib = "orjson" if serialization.orjson is not None else "json (stdlib)"
+    print(f"response JSON library: {json_lib}")
+    print(f"{'body':>10} {'old µs':>10} {'new µs':>10} {'speedup':>8}")
+    for size in SIZES:
+        body = make_body(size)
+        reply = json.dumps(
+            {"observations": [], "global_comment": SENTENCE * (size // 2000 + 1)}
+        )
+        old = measure(old_path, body, reply)
+        new = measure(new_path, body, reply)
+        print(
+            f"{len(body):>10} {old * 1e6:>10.1f} {new * 1e6:>10.1f} {old / new:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Cold start of the bridge: time from process start until GET /ready answers
+200, i.e. imports, lifespan and upstream warm-up. The server is started
+from a temporary directory, so nothing may depend on the working directory.
+Exits with status 1 when the median exceeds --max-seconds.
+
+    python benchmarks/bench_startup.py --runs 5 --max-seconds 3
+
+The environment is passed to the server; unless set, OPENAPI_KEY gets a
+dummy value and UPSTREAM_WARMUP_CONNECTIONS is 0 (no network needed).
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SRC), env.get("PYTHONPATH")]))
+    env.setdefault("OPENAPI_KEY", "bench")
+    env.setdefault("UPSTREAM_WARMUP_CONNECTIONS", "0")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    return env
+
+
+def import_time(env: dict, cwd: str) -> float:
+    code = (
+        "import time; t = time.perf_counter(); import ooo_llm_bridge.main; "
+        "print(time.perf_counter() - t)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(out.stdout)
+
+
+def time_to_ready(env: dict, cwd: str, timeout: float) -> float:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/ready"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "ooo_llm_bridge.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+        cwd=cwd,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with status {server.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"server not ready after {timeout} seconds")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=3.0,
+        help="regression threshold on the median time to ready",
+    )
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    env = server_env()
+    with tempfile.TemporaryDirectory() as cwd:
+        imports = [import_time(env, cwd) for _ in range(args.runs)]
+        ready = [time_to_ready(env, cwd, args.timeout) for _ in range(args.runs)]
+
+    print(f"import ooo_llm_bridge.main: {statistics.median(imports):.3f}s (median)")
+    print("time to ready: " + ", ".join(f"{t:.3f}s" for t in ready))
+    median = statistics.median(ready)
+    print(f"median: {median:.3f}s, threshold: {args.max_seconds:.3f}s")
+    if median > args.max_seconds:
+        print("FAIL: startup slower than the threshold", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,19 +5,27 @@ import threading
 import traceback
 import urllib.request
 from datetime import datetime, timezone
+from functools import cmp_to_key
 from typing import Optional, Tuple
 
 import uno
 import unohelper
 from com.sun.star.awt import XActionListener
-from com.sun.star.util import DateTime
+from com.sun.star.lang import XEventListener
+from com.sun.star.util import DateTime, XModifyListener
 
 # =============================
 # Config
 # =============================
 OPENAI_LOCAL_URL = "http://127.0.0.1:8000/ask"
+PREFETCH_LOCAL_URL = "http://127.0.0.1:8000/prefetch"
 LOG_PATH = os.path.join(os.path.expanduser("~"), "chatgpt_macro.log")
 EDITOR_NAME = "Anacleto"  # reviewer name
+# None → the bridge picks the model from its ladder; set a name to force it
+OPENAI_MODEL = None
+# pre-review: segment sent when there is no selection nor bookmark, and idle timeout
+PREREVIEW_LAST_PARAGRAPHS = 6
+PREREVIEW_IDLE_SECONDS = 30
 
 
 _LISTENER_REGISTRY = {}
@@ -79,6 +87,19 @@ def _http_post_json(url: str, payload: dict) -> dict:
         return json.loads(resp.read().decode("utf-8"))
 
 
+def _build_request_payload(
+    text: str, segment_uuid: Optional[str], comment_threads: list
+) -> dict:
+    # /ask e /prefetch devono ricevere lo stesso payload, altrimenti la
+    # pre-review non viene riconosciuta dal bridge
+    return {
+        "text": text,
+        "model": OPENAI_MODEL,
+        "uuid": segment_uuid,
+        "comment_threads": comment_threads,
+    }
+
+
 def _create_modeless_dialog(ctx, smgr, frame, initial_text: str):
     # Dialog model
     dialog_model = smgr.createInstanceWithContext(
@@ -152,12 +173,7 @@ def _start_background_request_and_timer(
         try:
             resp = _http_post_json(
                 OPENAI_LOCAL_URL,
-                {
-                    "text": text_to_send,
-                    "model": "gpt-5.1",
-                    "uuid": segment_uuid,
-                    "comment_threads": comment_threads,
-                },
+                _build_request_payload(text_to_send, segment_uuid, comment_threads),
             )
             reply = resp.get("reply", "[Nessuna risposta]")
             q.put(reply)
@@ -273,7 +289,247 @@ def ask_openai_with_selection_or_upto_cursor_modeless(event=None):
             pass
 
 
-def get_last_bookmark_in_selection():
+# =============================
+# Pre-review: the bridge reviews the current segment in background, so the
+# reply is ready when the user asks for it
+# =============================
+def _extract_current_segment(doc) -> Tuple[str, Optional[str]]:
+    """
+    Returns (text, uuid) of a bounded segment to pre-review; the text from
+    the start of the document is never sent in background.
+
+      - a non-empty selection, with the name of the last bookmark it
+        overlaps, exactly as /ask sends it;
+      - else the whole bookmark under the cursor, served when /ask is
+        called with that bookmark selected;
+      - else the last PREREVIEW_LAST_PARAGRAPHS paragraphs up to the
+        cursor (uuid None).
+    """
+    controller = doc.getCurrentController()
+    selection = controller.getSelection()
+    bm = get_last_bookmark_in_selection(doc)
+
+    segment_uuid = None
+    if bm is not None:
+        try:
+            segment_uuid = bm.getName()
+        except Exception:
+            pass
+
+    if selection.getCount() > 0 and selection.getByIndex(0).getString().strip():
+        return selection.getByIndex(0).getString(), segment_uuid
+
+    if bm is not None:
+        text = bm.getAnchor().getString()
+        if text.strip():
+            return text, segment_uuid
+
+    cursor = doc.Text.createTextCursorByRange(controller.getViewCursor().getEnd())
+    cursor.gotoEndOfParagraph(False)
+    for _ in range(PREREVIEW_LAST_PARAGRAPHS - 1):
+        if not cursor.gotoPreviousParagraph(True):
+            break
+    cursor.gotoStartOfParagraph(True)
+    return cursor.getString(), None
+
+
+def _prereview(doc):
+    try:
+        text, segment_uuid = _extract_current_segment(doc)
+        if not text.strip():
+            return
+        comment_threads = _serialize_annotation_threads(
+            _collect_annotations_in_threads(doc)
+        )
+        payload = _build_request_payload(text, segment_uuid, comment_threads)
+    except Exception:
+        _log_exc()
+        return
+
+    def worker():
+        try:
+            resp = _http_post_json(PREFETCH_LOCAL_URL, payload)
+            _log(f"prereview: uuid={segment_uuid} status={resp.get('status')}")
+        except Exception:
+            _log_exc()
+
+    threading.Thread(target=worker, daemon=True).start()
+
+
+class IdlePrereviewListener(unohelper.Base, XModifyListener):
+    """Restarts a timer on every change; when it expires, sends the pre-review."""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def modified(self, ev):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(
+                PREREVIEW_IDLE_SECONDS, _prereview, args=(self.doc,)
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    def disposing(self, ev):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+
+
+def prereview_current_segment(event=None):
+    """
+    Entry point to bind to the "Document has been saved" event
+    (Tools > Customize > Events).
+    """
+    _prereview(XSCRIPTCONTEXT.getDocument())  # noqa: F821
+
+
+def start_idle_prereview(event=None):
+    """
+    Entry point to bind to the "Open Document" event: from then on the
+    current segment is pre-reviewed after PREREVIEW_IDLE_SECONDS of inactivity.
+    """
+    try:
+        doc = XSCRIPTCONTEXT.getDocument()  # noqa: F821
+        key = ("idle", doc.RuntimeUID)
+        if key in _LISTENER_REGISTRY:
+            return
+        listener = IdlePrereviewListener(doc)
+        doc.addModifyListener(listener)
+        _LISTENER_REGISTRY[key] = listener
+    except Exception:
+        _log_exc()
+
+
+def _cmp_starts(text, a, b) -> int:
+    """
+    -1 if range a starts before range b, 0 if at the same position, 1 if after.
+    (compareRegionStarts returns the opposite sign: 1 means "a starts before b")
+    """
+    return -text.compareRegionStarts(a, b)
+
+
+def _cmp_ends(text, a, b) -> int:
+    """-1 if range a ends before range b, 0 if at the same position, 1 if after."""
+    return -text.compareRegionEnds(a, b)
+
+
+def _overlaps(text, anchor, sel_range) -> bool:
+    # two ranges overlap unless one ends before the other starts
+    return (
+        _cmp_starts(text, anchor, sel_range.getEnd()) <= 0
+        and _cmp_ends(text, anchor, sel_range.getStart()) >= 0
+    )
+
+
+class BookmarkIndex(unohelper.Base, XEventListener):
+    """
+    Bookmarks of the main text of a document, sorted by start position.
+    Built lazily, rebuilt only when the set of bookmarks changes: anchors
+    are live ranges, so editing the text moves them but never reorders them.
+
+    Alongside each bookmark we keep the anchor that ends furthest among it and
+    all the previous ones: scanning backwards from the selection we can stop
+    as soon as nothing earlier can reach it.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.text = doc.Text
+        self._entries = None  # [(bookmark, anchor)] sorted by start
+        self._max_end = None  # [anchor]
+        self._names = None
+        self._uid = doc.RuntimeUID
+        doc.addEventListener(self)
+
+    def disposing(self, ev):
+        self._entries = None
+        _LISTENER_REGISTRY.pop(("bookmarks", self._uid), None)
+
+    def _build(self, names):
+        bookmarks = self.doc.getBookmarks()
+        entries = []
+        for name in names:
+            bm = bookmarks.getByName(name)
+            anchor = bm.getAnchor()
+            # Ignore bookmarks in other "stories" (headers, footers, notes, etc.)
+            if anchor.getText() != self.text:
+                continue
+            entries.append((bm, anchor))
+
+        entries.sort(key=cmp_to_key(lambda x, y: _cmp_starts(self.text, x[1], y[1])))
+
+        max_end = []
+        furthest = None
+        for _, anchor in entries:
+            if furthest is None or _cmp_ends(self.text, anchor, furthest) > 0:
+                furthest = anchor
+            max_end.append(furthest)
+
+        self._entries = entries
+        self._max_end = max_end
+        self._names = names
+        _log(f"bookmark index: {len(entries)} bookmarks indexed")
+
+    def last_overlapping(self, sel_range):
+        # bookmark aggiunti, rimossi o rinominati: ricostruiamo
+        names = tuple(self.doc.getBookmarks().getElementNames())
+        if self._entries is None or names != self._names:
+            self._build(names)
+
+        text = self.text
+        entries = self._entries
+        sel_start = sel_range.getStart()
+        sel_end = sel_range.getEnd()
+
+        # binary search: lo = number of bookmarks starting at or before sel_end
+        lo, hi = 0, len(entries)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _cmp_starts(text, entries[mid][1], sel_end) <= 0:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        # the last one (by start) that still ends inside or after the selection
+        for i in range(lo - 1, -1, -1):
+            if _cmp_ends(text, self._max_end[i], sel_start) < 0:
+                return None
+            if _cmp_ends(text, entries[i][1], sel_start) >= 0:
+                return entries[i][0]
+        return None
+
+
+def _get_bookmark_index(doc) -> BookmarkIndex:
+    key = ("bookmarks", doc.RuntimeUID)
+    index = _LISTENER_REGISTRY.get(key)
+    if index is None:
+        index = BookmarkIndex(doc)
+        _LISTENER_REGISTRY[key] = index
+    return index
+
+
+def _scan_last_bookmark(doc, sel_range, sel_text):
+    """Linear scan, for selections outside the main text (tables, frames, ...)."""
+    bookmarks = doc.getBookmarks()
+    last_bookmark = None
+    last_anchor = None
+    for name in bookmarks.getElementNames():
+        bm = bookmarks.getByName(name)
+        anchor = bm.getAnchor()
+        if anchor.getText() != sel_text or not _overlaps(sel_text, anchor, sel_range):
+            continue
+        if last_anchor is None or _cmp_starts(sel_text, anchor, last_anchor) >= 0:
+            last_bookmark = bm
+            last_anchor = anchor
+    return last_bookmark
+
+
+def get_last_bookmark_in_selection(doc=None):
     """
     Return the last bookmark (UNO Bookmark object) that overlaps
     the current selection in the active Writer document, or None
@@ -284,11 +540,15 @@ def get_last_bookmark_in_selection():
       - selection is entirely inside the bookmark, OR
       - they partially intersect in any way.
 
-    This function uses UNO's compareRegionStarts/compareRegionEnds
-    on the XText of the main story, which is the only reliable way
-    to reason about positions in Writer (no offset math).
+    "Last" is the one whose start is furthest along the story.
+
+    Positions are compared with UNO's compareRegionStarts/compareRegionEnds,
+    the only reliable way to reason about positions in Writer (no offset
+    math). For the main text the bookmarks come from a cached index sorted
+    by position, so only a handful of comparisons are needed.
     """
-    doc = XSCRIPTCONTEXT.getDocument()  # noqa: F821
+    if doc is None:
+        doc = XSCRIPTCONTEXT.getDocument()  # noqa: F821
     selection = doc.getCurrentSelection()
 
     # No selection → nothing to do
@@ -299,62 +559,10 @@ def get_last_bookmark_in_selection():
     sel_range = selection.getByIndex(0)  # com.sun.star.text.XTextRange
     sel_text = sel_range.getText()  # com.sun.star.text.XText
 
-    bookmarks = doc.getBookmarks()  # XNameAccess
-    bookmark_names = bookmarks.getElementNames()
-
-    last_bookmark = None
-    last_anchor = None
-
-    for name in bookmark_names:
-        _log(f"bookmark: checking name={name}")
-
-        bm = bookmarks.getByName(name)  # com.sun.star.text.Bookmark
-        anchor = bm.getAnchor()  # XTextRange for the bookmark
-
-        # Ignore bookmarks in other "stories" (headers, footers, notes, etc.)
-        if anchor.getText() != sel_text:
-            continue
-
-        # Compare the bookmark range vs the selection range.
-        # start_rel < 0 → bookmark starts before selection
-        # start_rel = 0 → bookmark starts with selection
-        # start_rel > 0 → bookmark starts after selection
-        start_rel = sel_text.compareRegionStarts(anchor, sel_range)
-
-        # end_rel < 0 → bookmark ends before selection
-        # end_rel = 0 → bookmark ends with selection
-        # end_rel > 0 → bookmark ends after selection
-        end_rel = sel_text.compareRegionEnds(anchor, sel_range)
-
-        # Overlap condition (very important):
-        # Two ranges do NOT overlap iff:
-        #   - bookmark ends before selection starts (end_rel < 0), OR
-        #   - bookmark starts after selection ends (start_rel > 0)
-        #
-        # So they DO overlap iff NOT (end_rel < 0 or start_rel > 0).
-        if end_rel < 0 or start_rel > 0:
-            # No overlap → skip
-            continue
-
-        _log(f"bookmark: bookmark name={name} is inside the selection")
-
-        # At this point, the bookmark overlaps the selection.
-        # We want the "last" one: the one whose *start* is furthest
-        # along the story.
-        if last_anchor is None:
-            last_bookmark = bm
-            last_anchor = anchor
-        else:
-            # Compare starts of this anchor vs last_anchor
-            # cmp < 0 → this bookmark starts before last_anchor
-            # cmp = 0 → same start
-            # cmp > 0 → this bookmark starts after last_anchor
-            cmp = sel_text.compareRegionStarts(anchor, last_anchor)
-            if cmp >= 0:
-                last_bookmark = bm
-                last_anchor = anchor
+    if sel_text != doc.Text:
+        return _scan_last_bookmark(doc, sel_range, sel_text)
 
-    return last_bookmark
+    return _get_bookmark_index(doc).last_overlapping(sel_range)
 
 
 def _insert_feedback_from_json(doc, anchor_threads, json_text):
@@ -0,0 +1,421 @@
+"""
+Offline review of a whole manuscript, outside LibreOffice.
+
+    python -m ooo_llm_bridge.batch novel.odt -o novel-reviewed.odt -c 4
+
+The manuscript (.txt, .md or .odt) is split on headings, or on bookmarks for
+.odt with --split bookmarks; each segment goes through the same pipeline as
+/ask. Completed segments are appended to a checkpoint file, so an interrupted
+run resumes without paying again for them.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import re
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from xml.etree import ElementTree as ET
+
+from pydantic import BaseModel
+
+from ooo_llm_bridge.config import get_config
+from ooo_llm_bridge.metrics import Metrics
+from ooo_llm_bridge.models.message import ChatRequest
+from ooo_llm_bridge.review import load_review_context, run_review
+from ooo_llm_bridge.shared_state import RateLimiter, create_store
+from ooo_llm_bridge.upstream import create_openai_client
+
+EDITOR_NAME = "Anacleto"
+
+NS = {
+    "office": "urn:oasis:names:tc:opendocument:xmlns:office:1.0",
+    "text": "urn:oasis:names:tc:opendocument:xmlns:text:1.0",
+    "dc": "http://purl.org/dc/elements/1.1/",
+}
+
+
+def _q(tag: str) -> str:
+    prefix, name = tag.split(":")
+    return f"{{{NS[prefix]}}}{name}"
+
+
+class Segment(BaseModel):
+    index: int
+    title: str
+    uuid: Optional[str] = None
+    text: str
+
+    def key(self, mode: str, model: Optional[str]) -> str:
+        raw = json.dumps([self.text, mode, model], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# =============================
+# Reading
+# =============================
+_HEADING = re.compile(r"^#{1,6}\s+(.*)$")
+
+
+def split_plain_text(content: str) -> List[Segment]:
+    """Splits .txt/.md content on markdown-style headings ("# Title")."""
+    segments = []
+    title, lines = "(start)", []
+
+    def flush():
+        text = "\n".join(lines).strip()
+        if text:
+            segments.append(Segment(index=len(segments), title=title, text=text))
+
+    for line in content.splitlines():
+        m = _HEADING.match(line)
+        if m:
+            flush()
+            title, lines = m.group(1).strip(), []
+        else:
+            lines.append(line)
+    flush()
+    return segments
+
+
+def _odt_text(elem: ET.Element) -> str:
+    """Text of a paragraph, with ODF spaces/tabs/line breaks, skipping comments."""
+    parts = [elem.text or ""]
+    for child in elem:
+        if child.tag == _q("text:s"):
+            parts.append(" " * int(child.get(_q("text:c"), "1")))
+        elif child.tag == _q("text:tab"):
+            parts.append("\t")
+        elif child.tag == _q("text:line-break"):
+            parts.append("\n")
+        elif child.tag != _q("office:annotation"):
+            parts.append(_odt_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+# non fanno parte del testo: commenti e testo cancellato con le revisioni
+_SKIPPED = (_q("office:annotation"), _q("text:tracked-changes"))
+
+
+def _odt_paragraphs(body: ET.Element):
+    """Yields the text:h / text:p elements of the body in document order."""
+    for elem in body:
+        if elem.tag in (_q("text:h"), _q("text:p")):
+            yield elem
+        elif elem.tag not in _SKIPPED:
+            yield from _odt_paragraphs(elem)
+
+
+def _paragraph_bookmark(elem: ET.Element) -> Optional[str]:
+    for tag in ("text:bookmark", "text:bookmark-start"):
+        bm = elem.find(f".//{_q(tag)}")
+        if bm is not None:
+            return bm.get(_q("text:name"))
+    return None
+
+
+def split_odt(
+    root: ET.Element, split: str
+) -> Tuple[List[Segment], Dict[int, List[ET.Element]]]:
+    """
+    Returns the segments and, for each segment index, its paragraph elements
+    (used to write the comments back into the document).
+    """
+    body = root.find(f"{_q('office:body')}/{_q('office:text')}")
+    segments: List[Segment] = []
+    paragraphs: Dict[int, List[ET.Element]] = {}
+    title, uuid, current = "(start)", None, []
+
+    def flush():
+        # un titolo da solo (p.es. prima del primo bookmark) non è un segmento
+        if not any(p.tag == _q("text:p") for p in current):
+            return
+        text = "\n".join(_odt_text(p) for p in current).strip()
+        if text:
+            paragraphs[len(segments)] = list(current)
+            segments.append(
+                Segment(index=len(segments), title=title, uuid=uuid, text=text)
+            )
+
+    for p in _odt_paragraphs(body):
+        if split == "headings" and p.tag == _q("text:h"):
+            flush()
+            title, uuid, current = _odt_text(p).strip(), None, []
+            continue
+        if split == "bookmarks":
+            name = _paragraph_bookmark(p)
+            if name is not None:
+                flush()
+                title, uuid, current = name, name, []
+        current.append(p)
+    flush()
+    return segments, paragraphs
+
+
+def _parse_odt(path: str) -> ET.Element:
+    with zipfile.ZipFile(path) as z:
+        data = z.read("content.xml")
+    # ElementTree rinomina i prefissi: registriamo quelli originali
+    for _, (prefix, uri) in ET.iterparse(io.BytesIO(data), events=("start-ns",)):
+        ET.register_namespace(prefix, uri)
+    return ET.fromstring(data)
+
+
+# =============================
+# Writing
+# =============================
+def _parse_reply(reply: str) -> Any:
+    try:
+        return json.loads(reply)
+    except (TypeError, ValueError):
+        return reply
+
+
+def _annotation(content: str, date: str) -> ET.Element:
+    ann = ET.Element(_q("office:annotation"))
+    ET.SubElement(ann, _q("dc:creator")).text = EDITOR_NAME
+    ET.SubElement(ann, _q("dc:date")).text = date
+    for line in content.split("\n"):
+        ET.SubElement(ann, _q("text:p")).text = line
+    return ann
+
+
+def _observation_text(obs: Dict[str, Any]) -> str:
+    # stesso formato dei commenti inseriti dalla macro
+    lines = [f"[{obs.get('category', 'other')}/{obs.get('severity', 'minor')}]"]
+    if obs.get("comment"):
+        lines.append(obs["comment"].strip())
+    if obs.get("suggested_rewrite"):
+        lines += ["", "Suggested rewrite:", obs["suggested_rewrite"]]
+    return "\n".join(lines)
+
+
+def annotate_odt(
+    root: ET.Element,
+    paragraphs: Dict[int, List[ET.Element]],
+    replies: Dict[int, str],
+) -> int:
+    """
+    Adds one comment per observation, at the start of the first paragraph of
+    the segment containing its target snippet (else of the segment itself).
+    Returns the number of comments added.
+    """
+    date = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    added = 0
+    for index, reply in replies.items():
+        data = _parse_reply(reply)
+        if not isinstance(data, dict) or index not in paragraphs:
+            continue
+        paras = paragraphs[index]
+        texts = [_odt_text(p).lower() for p in paras]
+
+        notes = [
+            (obs.get("target_snippet") or "", _observation_text(obs))
+            for obs in data.get("observations", [])
+        ]
+        if data.get("global_comment"):
+            notes.append(("", data["global_comment"]))
+
+        for snippet, content in notes:
+            snippet = snippet.strip().lower()
+            target = next(
+                (p for p, t in zip(paras, texts) if snippet and snippet in t), paras[0]
+            )
+            ann = _annotation(content, date)
+            ann.tail = target.text
+            target.text = None
+            target.insert(0, ann)
+            added += 1
+    return added
+
+
+def write_odt(src: str, dst: str, root: ET.Element) -> None:
+    content = ET.tostring(root, encoding="utf-8", xml_declaration=True)
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst, "w") as zout:
+        for item in zin.infolist():
+            data = content if item.filename == "content.xml" else zin.read(item)
+            # "mimetype" deve restare il primo file, non compresso
+            compress = (
+                zipfile.ZIP_STORED
+                if item.filename == "mimetype"
+                else zipfile.ZIP_DEFLATED
+            )
+            zout.writestr(item, data, compress_type=compress)
+
+
+# =============================
+# Checkpoint
+# =============================
+def load_checkpoint(path: str) -> Dict[str, str]:
+    done = {}
+    try:
+        with open(path, "r", encoding="utf8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    done[entry["key"]] = entry["reply"]
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def _append_checkpoint(path: str, key: str, segment: Segment, reply: str) -> None:
+    entry = {"key": key, "index": segment.index, "title": segment.title, "reply": reply}
+    with open(path, "a", encoding="utf8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+# =============================
+# Main
+# =============================
+def _progress(done: int, total: int, started: float, failed: int) -> None:
+    elapsed = time.monotonic() - started
+    rate = done / elapsed if elapsed > 0 else 0.0
+    eta = (total - done) / rate if rate > 0 else 0.0
+    print(
+        f"[{done}/{total}] {rate * 60:.1f} segments/min, "
+        f"ETA {int(eta // 60)}:{int(eta % 60):02d}"
+        + (f", {failed} failed" if failed else ""),
+        file=sys.stderr,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m ooo_llm_bridge.batch",
+        description="Review a whole manuscript with the bridge pipeline.",
+    )
+    parser.add_argument("input", help=".txt, .md or .odt manuscript")
+    parser.add_argument(
+        "-o", "--output", help="output .json or .odt (default: <input>.review.json)"
+    )
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--split", choices=["headings", "bookmarks"], default="headings"
+    )
+    parser.add_argument("--mode", default="dialoghi")
+    parser.add_argument("--model", help="force a model instead of the ladder")
+    parser.add_argument(
+        "--checkpoint", help="checkpoint file (default: <output>.checkpoint.jsonl)"
+    )
+    args = parser.parse_args(argv)
+
+    output = args.output or f"{args.input}.review.json"
+    checkpoint = args.checkpoint or f"{output}.checkpoint.jsonl"
+    is_odt = args.input.lower().endswith(".odt")
+
+    if output.lower().endswith(".odt") and not is_odt:
+        parser.error("a commented .odt can only be produced from an .odt input")
+
+    if is_odt:
+        root = _parse_odt(args.input)
+        segments, paragraphs = split_odt(root, args.split)
+    else:
+        with open(args.input, "r", encoding="utf8") as f:
+            segments = split_plain_text(f.read())
+
+    keys = {s.index: s.key(args.mode, args.model) for s in segments}
+    done = load_checkpoint(checkpoint)
+    replies = {s.index: done[keys[s.index]] for s in segments if keys[s.index] in done}
+    todo = [s for s in segments if s.index not in replies]
+    print(
+        f"{len(segments)} segments, {len(replies)} from checkpoint, {len(todo)} to review",
+        file=sys.stderr,
+    )
+
+    config = get_config()
+    context = load_review_context(config.CONTEXT_PATH, config.SYSTEM_PROMPT_PATH)
+    client, http_client = create_openai_client(config)
+    metrics = Metrics()
+    # con SHARED_STATE_PATH la quota è condivisa con il bridge in esecuzione
+    store = create_store(config)
+    rate_limiter = RateLimiter(store, config.UPSTREAM_RPM, config.UPSTREAM_BURST)
+
+    def review(segment: Segment) -> str:
+        chat_request = ChatRequest(
+            text=segment.text,
+            model=args.model,
+            uuid=segment.uuid,
+            mode=args.mode,
+            comment_threads=[],
+        )
+        rate_limiter.acquire_blocking()
+        if stopping.is_set():
+            raise RuntimeError("interrupted")
+        reply = run_review(client, metrics, context, chat_request, lane="batch")
+        # subito, dal worker: una risposta pagata non va persa con un Ctrl-C
+        with checkpoint_lock:
+            _append_checkpoint(checkpoint, keys[segment.index], segment, reply)
+        return reply
+
+    failed = 0
+    started = time.monotonic()
+    checkpoint_lock = threading.Lock()
+    stopping = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    try:
+        futures = {pool.submit(review, s): s for s in todo}
+        for n, future in enumerate(as_completed(futures), start=1):
+            segment = futures[future]
+            try:
+                reply = future.result()
+            except Exception as e:
+                failed += 1
+                print(
+                    f"segment {segment.index} ({segment.title}) failed: {e}",
+                    file=sys.stderr,
+                )
+            else:
+                replies[segment.index] = reply
+            _progress(n, len(todo), started, failed)
+    except BaseException as e:
+        # i segmenti in coda non partono; quelli in corso finiscono nel checkpoint
+        stopping.set()
+        print("Stopping: waiting for the requests in flight...", file=sys.stderr)
+        pool.shutdown(wait=True, cancel_futures=True)
+        if isinstance(e, KeyboardInterrupt):
+            print(
+                f"Interrupted, run again to resume from {checkpoint}", file=sys.stderr
+            )
+            return 130
+        raise
+    else:
+        pool.shutdown()
+    finally:
+        if http_client is not None:
+            http_client.close()
+        store.close()
+
+    if output.lower().endswith(".odt"):
+        added = annotate_odt(root, paragraphs, replies)
+        write_odt(args.input, output, root)
+        print(f"{added} comments written to {output}", file=sys.stderr)
+    else:
+        result = [
+            {
+                "index": s.index,
+                "title": s.title,
+                "uuid": s.uuid,
+                "review": (
+                    _parse_reply(replies[s.index]) if s.index in replies else None
+                ),
+            }
+            for s in segments
+        ]
+        with open(output, "w", encoding="utf8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Reviews written to {output}", file=sys.stderr)
+
+    print(json.dumps(metrics.snapshot()["routes"], indent=2), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletion
+
+logger = logging.getLogger(__name__)
+
+
+class CassetteMissError(LookupError):
+    pass
+
+
+def request_key(kwargs: Dict[str, Any]) -> str:
+    """
+    Hash stabile dei parametri passati a chat.completions.create:
+    stessa richiesta → stessa chiave, indipendentemente dall'ordine delle chiavi.
+    """
+    canonical = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CassetteClient:
+    """
+    Drop-in replacement for the OpenAI client as used by the bridge
+    (only `client.chat.completions.create` is exposed).
+
+    - mode="record": forwards to the real client and appends one JSON line per
+      call to `path` with the request hash, upstream latency, token usage
+      and the raw completion.
+    - mode="replay": never touches the network; serves the recorded completion
+      for the same request hash, sleeping `elapsed / speed` seconds first
+      (speed=0 replies immediately).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str,
+        client: Optional[Any] = None,
+        speed: float = 1.0,
+    ):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode '{mode}'")
+        if mode == "record" and client is None:
+            raise ValueError("Record mode needs an upstream client")
+
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._client = client
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+        if mode == "replay":
+            self._load()
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    # le registrazioni più recenti sovrascrivono le precedenti
+                    self._entries[entry["key"]] = entry
+        logger.info(f"Cassette loaded: {len(self._entries)} entries from {self.path}")
+
+    def create(self, **kwargs) -> "ChatCompletion":
+        key = request_key(kwargs)
+        if self.mode == "replay":
+            return self._replay(key)
+        return self._record(key, kwargs)
+
+    def _replay(self, key: str) -> "ChatCompletion":
+        entry = self._entries.get(key)
+        if entry is None:
+            raise CassetteMissError(f"No recorded completion for request {key[:12]}")
+
+        if self.speed > 0:
+            time.sleep(entry["elapsed"] / self.speed)
+
+        from openai.types.chat import ChatCompletion
+
+        return ChatCompletion.model_validate(entry["response"])
+
+    def _record(self, key: str, kwargs: Dict[str, Any]) -> "ChatCompletion":
+        start = time.perf_counter()
+        completion = self._client.chat.completions.create(**kwargs)
+        elapsed = time.perf_counter() - start
+
+        entry = {
+            "key": key,
+            "recorded_at": time.time(),
+            "elapsed": round(elapsed, 4),
+            "usage": completion.usage.model_dump() if completion.usage else None,
+            "response": completion.model_dump(mode="json", exclude_unset=True),
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            with open(self.path, "a", encoding="utf8") as f:
+                f.write(line + "\n")
+
+        return completion
@@ -1,17 +1,82 @@
 from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from ooo_llm_bridge.routing import ModelRoute
+
+# src/data, whatever the working directory
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
 
 class BaseConfig(BaseSettings):
     model_config = SettingsConfigDict(extra="ignore")
 
     OPENAPI_KEY: str
 
+    # editorial context and system prompt, read at startup
+    CONTEXT_PATH: Path = DATA_DIR / "full_context.json"
+    SYSTEM_PROMPT_PATH: Path = DATA_DIR / "prompts" / "system.txt"
+
+    # upstream HTTP transport
+    UPSTREAM_BASE_URL: str = "https://api.openai.com/v1"
+    UPSTREAM_MAX_CONNECTIONS: int = 20
+    UPSTREAM_MAX_KEEPALIVE: int = 10
+    UPSTREAM_KEEPALIVE_EXPIRY: float = 120.0
+    UPSTREAM_HTTP2: bool = False
+    UPSTREAM_CONNECT_TIMEOUT: float = 5.0
+    # a full review can take minutes
+    UPSTREAM_READ_TIMEOUT: float = 600.0
+    # connections opened at startup, before /ready answers 200
+    UPSTREAM_WARMUP_CONNECTIONS: int = 2
+
+    # model ladder, from the smallest model to the largest one: each request
+    # goes to the first rung it fits in (the client can still force a model)
+    MODEL_LADDER: List[ModelRoute] = [
+        ModelRoute(model="gpt-5-mini", max_input_tokens=1500, max_threads=3),
+        ModelRoute(model="gpt-5.1"),
+    ]
+
+    # low-priority lane for pre-reviews (POST /prefetch)
+    SPECULATIVE_MAX_PENDING: int = 8
+    SPECULATIVE_TTL: float = 1800.0
+
+    # state shared by the workers (cache, rate limit, in-flight requests,
+    # jobs): a SQLite file in WAL mode; None → in memory, single process
+    SHARED_STATE_PATH: Optional[str] = None
+    CACHE_MAX_ENTRIES: int = 256
+    # identical /ask requests within this window get the same reply
+    DEDUP_TTL: float = 15.0
+    # upstream quota, shared by all the workers (None → no limit)
+    UPSTREAM_RPM: Optional[float] = None
+    UPSTREAM_BURST: int = 5
+    # tokens of the burst that pre-reviews never take, kept for /ask
+    UPSTREAM_RESERVE: int = 2
+    # longer waits for the quota are answered with 429
+    RATE_LIMIT_MAX_WAIT: float = 30.0
+
+    # logging: "json" for production, "rich" console for development
+    LOG_FORMAT: Literal["json", "rich"] = "rich"
+    LOG_LEVEL: str = "DEBUG"
+    # log full manuscripts/replies instead of their size and hash
+    LOG_BODIES: bool = False
+    # per-logger sampling rate, e.g. {"ooo_llm_bridge.routers": 0.1}
+    LOG_SAMPLING: Dict[str, float] = {}
+
+    # /admin endpoints (profiling), disabled when not set
+    ADMIN_TOKEN: Optional[str] = None
+    # SIGUSR2 profiles the next PROFILE_SIGNAL_SECONDS seconds and writes the
+    # report in PROFILE_REPORT_DIR (default: the temp directory)
+    PROFILE_SIGNAL_SECONDS: float = 30.0
+    PROFILE_REPORT_DIR: Optional[str] = None
+
+    # record/replay of upstream completions (see cassette.py)
+    CASSETTE_MODE: Literal["off", "record", "replay"] = "off"
+    CASSETTE_PATH: Path = DATA_DIR / "cassette.jsonl"
+    CASSETTE_SPEED: float = 1.0
+
 
 @lru_cache()
 def get_config():
     return BaseConfig()
-
-
-config = get_config()
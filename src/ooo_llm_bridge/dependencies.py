@@ -1,5 +1,78 @@
 from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from ooo_llm_bridge.models.message import ChatRequest
 
 
 def get_openai_client(request: Request):
     return request.app.state.openai_client
+
+
+def get_review_context(request: Request):
+    return request.app.state.review_context
+
+
+def get_metrics(request: Request):
+    return request.app.state.metrics
+
+
+def get_speculative_lane(request: Request):
+    return request.app.state.speculative_lane
+
+
+def get_store(request: Request):
+    return request.app.state.store
+
+
+def get_review_executor(request: Request):
+    return request.app.state.review_executor
+
+
+def get_rate_limiter(request: Request):
+    return request.app.state.rate_limiter
+
+
+async def get_chat_request(request: Request) -> ChatRequest:
+    """
+    Parses and validates the body in one pass (pydantic-core reads the JSON
+    directly), instead of json.loads + validation of the resulting dicts.
+    """
+    body = await request.body()
+    try:
+        return ChatRequest.model_validate_json(body)
+    except ValidationError as e:
+        # stessa forma degli errori di FastAPI: loc relativo al body
+        errors = [
+            {**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)
+        ]
+        raise RequestValidationError(errors) from e
+
+
+# schema del body per OpenAPI, visto che non è più un parametro del handler:
+# ChatRequest e i modelli annidati vanno registrati in components
+_CHAT_REQUEST_SCHEMA = ChatRequest.model_json_schema(
+    ref_template="#/components/schemas/{model}"
+)
+
+chat_request_openapi = {
+    "requestBody": {
+        "content": {
+            "application/json": {"schema": {"$ref": "#/components/schemas/ChatRequest"}}
+        },
+        "required": True,
+    }
+}
+
+
+def add_chat_request_schemas(openapi_schema: dict) -> dict:
+    """Registers the schemas referenced by chat_request_openapi."""
+    schemas = openapi_schema.setdefault("components", {}).setdefault("schemas", {})
+    request_schema = dict(_CHAT_REQUEST_SCHEMA)
+    schemas.update(request_schema.pop("$defs", {}))
+    schemas["ChatRequest"] = request_schema
+    return openapi_schema
+
+
+def get_profiler(request: Request):
+    return request.app.state.profiler
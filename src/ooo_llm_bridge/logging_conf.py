@@ -1,31 +1,140 @@
-from logging.config import dictConfig
-
-
-def configure_logging() -> None:
-    dictConfig(
-        {
-            "version": 1,
-            "disable_existing_loggers": False,
-            "formatters": {
-                "console": {
-                    "class": "logging.Formatter",
-                    "datefmt": "%Y-%m-%dT%H:%M:%S",
-                    "format": "%(name)s:%(lineno)d - %(message)s",
-                }
-            },
-            "handlers": {
-                "default": {
-                    "class": "rich.logging.RichHandler",
-                    "level": "DEBUG",
-                    "formatter": "console",
-                }
-            },
-            "loggers": {
-                "ooo_llm_bridge": {
-                    "handlers": ["default"],
-                    "level": "DEBUG",
-                    "propagate": False,
-                }
-            },
+import hashlib
+import json
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+# attributi standard di LogRecord: tutto il resto arriva da `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {
+        k: v
+        for k, v in record.__dict__.items()
+        if k not in _RECORD_ATTRS and not k.startswith("_")
+    }
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message + extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "line": record.lineno,
+            "msg": record.getMessage(),
         }
-    )
+        entry.update(_extra_fields(record))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Development format: the message followed by the extra fields, if any."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        extra = _extra_fields(record)
+        if extra:
+            text += " " + " ".join(f"{k}={v}" for k, v in extra.items())
+        return text
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the records of the given loggers, e.g.
+    {"ooo_llm_bridge.routers": 0.1}. The longest matching prefix wins;
+    warnings and errors are never dropped.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda kv: len(kv[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return random.random() < rate
+        return True
+
+
+_log_bodies = False
+
+
+class _TextHash:
+    """Hash of a text, computed only when the record is formatted."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __str__(self) -> str:
+        return hashlib.sha1(self.text.encode("utf-8")).hexdigest()[:12]
+
+
+def text_fields(name: str, text: Optional[str]) -> Dict[str, Any]:
+    """
+    Campi `extra=` per descrivere un testo nei log: lunghezza e hash,
+    il testo completo solo se LOG_BODIES è attivo. L'hash viene calcolato
+    dal thread del listener, solo per i record che superano il campionamento.
+    """
+    if text is None:
+        return {f"{name}_len": 0}
+    fields: Dict[str, Any] = {
+        f"{name}_len": len(text),
+        f"{name}_sha": _TextHash(text),
+    }
+    if _log_bodies:
+        fields[name] = text
+    return fields
+
+
+def configure_logging(
+    fmt: str = "rich",
+    level: str = "DEBUG",
+    log_bodies: bool = False,
+    sampling: Optional[Dict[str, float]] = None,
+) -> QueueListener:
+    """
+    The request path only enqueues records (QueueHandler); formatting and
+    output happen on the listener thread. `fmt="json"` writes JSON lines to
+    stderr, `fmt="rich"` keeps the Rich console for development.
+
+    Returns the started listener: stop it on shutdown to flush the queue.
+    """
+    global _log_bodies
+    _log_bodies = log_bodies
+
+    if fmt == "json":
+        handler: logging.Handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+    else:
+        from rich.logging import RichHandler
+
+        handler = RichHandler()
+        handler.setFormatter(
+            ConsoleFormatter("%(name)s:%(lineno)d - %(message)s", "%Y-%m-%dT%H:%M:%S")
+        )
+
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = QueueHandler(q)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger("ooo_llm_bridge")
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    root.propagate = False
+
+    listener = QueueListener(q, handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -1,31 +1,150 @@
+import asyncio
 import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+from functools import partial
 
 from fastapi import FastAPI
-from openai import OpenAI
 
 from ooo_llm_bridge.config import get_config
+from ooo_llm_bridge.dependencies import add_chat_request_schemas
 from ooo_llm_bridge.logging_conf import configure_logging
+from ooo_llm_bridge.metrics import Metrics
+from ooo_llm_bridge.profiling import Profiler
+from ooo_llm_bridge.review import load_review_context, run_review
+from ooo_llm_bridge.routers.admin import admin_router
+from ooo_llm_bridge.routers.health import health_router
+from ooo_llm_bridge.routers.metrics import metrics_router
 from ooo_llm_bridge.routers.segments import ask_router
+from ooo_llm_bridge.shared_state import RateLimiter, create_store
+from ooo_llm_bridge.speculative import SpeculativeLane
+from ooo_llm_bridge.upstream import create_openai_client, pool_stats, warm_up
 
 logger = logging.getLogger(__name__)
 
 
+def _install_profile_signal(profiler: Profiler, config) -> None:
+    def on_signal():
+        try:
+            profiler.start(seconds=config.PROFILE_SIGNAL_SECONDS)
+        except RuntimeError as e:
+            logger.warning(str(e))
+
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, on_signal)
+    except (NotImplementedError, AttributeError, RuntimeError):
+        # Windows, o loop fuori dal main thread: resta l'endpoint /admin/profile
+        logger.debug("SIGUSR2 profiling not available")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    config = get_config()
+
     # setup logging
-    configure_logging()
+    log_listener = configure_logging(
+        fmt=config.LOG_FORMAT,
+        level=config.LOG_LEVEL,
+        log_bodies=config.LOG_BODIES,
+        sampling=config.LOG_SAMPLING,
+    )
     logger.info("logging configured")
 
+    app.state.review_context = load_review_context(
+        config.CONTEXT_PATH, config.SYSTEM_PROMPT_PATH
+    )
+    app.state.metrics = Metrics()
+    app.state.profiler = Profiler(config.PROFILE_REPORT_DIR)
+    _install_profile_signal(app.state.profiler, config)
+    app.state.store = create_store(config)
+    app.state.rate_limiter = RateLimiter(
+        app.state.store,
+        per_minute=config.UPSTREAM_RPM,
+        burst=config.UPSTREAM_BURST,
+        max_wait=config.RATE_LIMIT_MAX_WAIT,
+        reserve=config.UPSTREAM_RESERVE,
+    )
+
     # setup openai
-    app.state.openai_client = OpenAI(api_key=get_config().OPENAPI_KEY)
-    logger.info("OpenAI client initialized")
+    app.state.openai_client, http_client = create_openai_client(config)
+    warmup_task = None
+    if http_client is None:
+        app.state.ready = True
+    else:
+        app.state.ready = False
+        app.state.metrics.add_gauge("upstream_pool", partial(pool_stats, http_client))
+
+        async def warm_up_upstream():
+            opened = await asyncio.to_thread(
+                warm_up,
+                http_client,
+                config.UPSTREAM_BASE_URL,
+                config.UPSTREAM_WARMUP_CONNECTIONS,
+            )
+            app.state.ready = True
+            logger.info(f"Upstream warmed up: {opened} requests, ready")
+
+        warmup_task = asyncio.create_task(warm_up_upstream())
+
+    # review in un pool dedicato, dimensionato come il pool di connessioni:
+    # il default executor di asyncio ha min(32, CPU + 4) thread, che una
+    # manciata di chiamate upstream lunghe occuperebbe tutti
+    app.state.review_executor = ThreadPoolExecutor(
+        max_workers=config.UPSTREAM_MAX_CONNECTIONS, thread_name_prefix="review"
+    )
+
+    # setup low-priority lane for pre-reviews
+    app.state.speculative_lane = SpeculativeLane(
+        partial(
+            app.state.profiler.run,
+            run_review,
+            app.state.openai_client,
+            app.state.metrics,
+            app.state.review_context,
+            lane="speculative",
+        ),
+        app.state.store,
+        max_pending=config.SPECULATIVE_MAX_PENDING,
+        ttl=config.SPECULATIVE_TTL,
+        job_ttl=config.UPSTREAM_READ_TIMEOUT,
+        # bassa priorità: aspetta la quota senza limiti, lasciando la riserva a /ask
+        acquire=partial(
+            app.state.rate_limiter.acquire, max_wait=float("inf"), low_priority=True
+        ),
+        executor=app.state.review_executor,
+    )
+    app.state.metrics.add_gauge("speculative", app.state.speculative_lane.snapshot)
+    speculative_task = asyncio.create_task(app.state.speculative_lane.run_forever())
 
     yield
 
+    speculative_task.cancel()
+    app.state.review_executor.shutdown(wait=False, cancel_futures=True)
+    if warmup_task is not None:
+        warmup_task.cancel()
     app.state.openai_client = None
+    if http_client is not None:
+        http_client.close()
     logger.info("OpenAI client released")
 
+    await app.state.profiler.close()
+    app.state.store.close()
+
+    log_listener.stop()
+
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(ask_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
+app.include_router(admin_router)
+
+
+def _openapi() -> dict:
+    if app.openapi_schema is None:
+        app.openapi_schema = add_chat_request_schemas(FastAPI.openapi(app))
+    return app.openapi_schema
+
+
+app.openapi = _openapi
@@ -0,0 +1,80 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RouteStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        ok = self.count - self.errors
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "latency_avg": (
+                round(self.latency_sum / self.count, 4) if self.count else None
+            ),
+            "latency_max": round(self.latency_max, 4),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "completion_tokens_avg": (
+                round(self.completion_tokens / ok, 1) if ok else None
+            ),
+        }
+
+
+class Metrics:
+    """
+    In-process counters, exposed as JSON by GET /metrics.
+
+    - routes: upstream latency and token usage per model route
+    - gauges: values computed on demand by the registered callables
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, RouteStats] = defaultdict(RouteStats)
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+
+    def observe_completion(
+        self,
+        route: str,
+        latency: float,
+        usage: Optional[Any] = None,
+        error: bool = False,
+    ) -> None:
+        with self._lock:
+            stats = self._routes[route]
+            stats.count += 1
+            stats.latency_sum += latency
+            stats.latency_max = max(stats.latency_max, latency)
+            if error:
+                stats.errors += 1
+            if usage is not None:
+                stats.prompt_tokens += usage.prompt_tokens or 0
+                stats.completion_tokens += usage.completion_tokens or 0
+
+    def add_gauge(self, name: str, fn: Callable[[], Any]) -> None:
+        self._gauges[name] = fn
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {name: s.as_dict() for name, s in self._routes.items()}
+        gauges = {}
+        for name, fn in self._gauges.items():
+            # un gauge rotto non deve far fallire tutto /metrics
+            try:
+                gauges[name] = fn()
+            except Exception as e:
+                logger.warning(f"Gauge {name} failed: {e!r}")
+                gauges[name] = {"error": repr(e)}
+        return {"routes": routes, "gauges": gauges}
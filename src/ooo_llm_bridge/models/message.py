@@ -8,6 +8,11 @@ class ChatResponse(BaseModel):
     reply: str
 
 
+class PrefetchResponse(BaseModel):
+    # queued | running | cached
+    status: str
+
+
 class Annotation(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     author: str
@@ -24,7 +29,8 @@ class CommentThread(BaseModel):
 
 class ChatRequest(BaseModel):
     text: str
-    model: str
+    # None → the bridge picks the model from MODEL_LADDER
+    model: Optional[str] = None
     comment_threads: list[CommentThread]
     uuid: Optional[str] = None
     mode: Optional[str] = None
@@ -0,0 +1,266 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# funzioni del percorso di richiesta da evidenziare nel report (il contesto
+# si costruisce all'avvio, non per richiesta)
+FOCUS = (
+    r"run_review|build_messages|choose_route|serialization|model_validate_json"
+    r"|logging_conf"
+)
+
+
+class ProfilingSession:
+    """
+    cProfile on the event-loop thread, plus a lag monitor (a task measuring
+    how late its sleeps wake up) and a watchdog thread that, when the loop
+    stops answering for more than `block_threshold` seconds, records the
+    stack the loop thread is stuck in.
+
+    cProfile only sees the thread that enabled it: work handed to a thread
+    pool goes through `run`, which profiles each call on its own; the
+    report merges them with the event-loop profile.
+    """
+
+    def __init__(
+        self,
+        requests: Optional[int],
+        seconds: Optional[float],
+        lag_interval: float = 0.05,
+        block_threshold: float = 0.1,
+    ):
+        self.requests = requests
+        self.seconds = seconds
+        self.lag_interval = lag_interval
+        self.block_threshold = block_threshold
+
+        self.started = time.time()
+        self.stopped: Optional[float] = None
+        self.served = 0
+        self.lags: List[float] = []
+        self.blocking: Counter = Counter()
+
+        self._profile = cProfile.Profile()
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._thread_lock = threading.Lock()
+        self._heartbeat = time.monotonic()
+        self._loop_thread = threading.get_ident()
+        self._tasks: List[asyncio.Task] = []
+        self.done = asyncio.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> bool:
+        return self.stopped is None
+
+    def start(self) -> None:
+        """Must be called from the event-loop thread."""
+        self._tasks.append(asyncio.create_task(self._monitor_lag()))
+        if self.seconds is not None:
+            self._tasks.append(asyncio.create_task(self._stop_after(self.seconds)))
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+        self._profile.enable()
+
+    def stop(self) -> None:
+        if not self.active:
+            return
+        self._profile.disable()
+        self.stopped = time.time()
+        self.done.set()
+        for task in self._tasks:
+            if task is not asyncio.current_task():
+                task.cancel()
+
+    def request_done(self) -> None:
+        self.served += 1
+        if self.requests is not None and self.served >= self.requests:
+            self.stop()
+
+    def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Runs fn in the calling (pool) thread, profiled while the session is active."""
+        if not self.active:
+            return fn(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python ≥ 3.12: cProfile usa sys.monitoring, globale al processo;
+            # il profilo del loop copre già anche questo thread
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._thread_lock:
+                self._thread_profiles.append(profile)
+
+    async def _stop_after(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+        self.stop()
+
+    async def _monitor_lag(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.lag_interval)
+            self._heartbeat = time.monotonic()
+            self.lags.append(self._heartbeat - start - self.lag_interval)
+
+    def _watch(self) -> None:
+        reported = None
+        while self.active:
+            time.sleep(self.block_threshold / 2)
+            beat = self._heartbeat
+            if time.monotonic() - beat < self.block_threshold or beat == reported:
+                continue
+            # il loop non risponde: dove è fermo?
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                stack = traceback.format_stack(frame, limit=8)
+                self.blocking["".join(stack)] += 1
+            reported = beat
+
+    def report(self, limit: int = 40) -> Dict[str, Any]:
+        out = io.StringIO()
+        stats = None
+        # pstats ferma il profiler: le statistiche solo a sessione conclusa;
+        # le chiamate nei thread ancora in corso restano fuori
+        if not self.active:
+            with self._thread_lock:
+                profiles = [self._profile, *self._thread_profiles]
+            for profile in profiles:
+                try:
+                    if stats is None:
+                        stats = pstats.Stats(profile, stream=out)
+                    else:
+                        stats.add(profile)
+                except TypeError:  # nessuna chiamata registrata
+                    pass
+        if stats is not None:
+            stats.strip_dirs().sort_stats("cumulative")
+            stats.print_stats(limit)
+            out.write("\n=== request path ===\n")
+            stats.print_stats(FOCUS, limit)
+
+        lags = sorted(self.lags)
+        return {
+            "active": self.active,
+            "started": self.started,
+            "duration": round((self.stopped or time.time()) - self.started, 3),
+            "requests": self.served,
+            "loop_lag": {
+                "samples": len(lags),
+                "avg": round(sum(lags) / len(lags), 4) if lags else None,
+                "p99": round(lags[int(len(lags) * 0.99)], 4) if lags else None,
+                "max": round(lags[-1], 4) if lags else None,
+            },
+            "blocking_calls": [
+                {"count": n, "stack": stack}
+                for stack, n in self.blocking.most_common(10)
+            ],
+            "stats": out.getvalue(),
+        }
+
+
+class Profiler:
+    """
+    Entry point used by the handlers: while no session is running, tracking
+    a request costs one attribute check.
+
+    Sessions are per process: every report is also written to `report_dir`,
+    named after the worker pid, so that with several workers it can be read
+    from any of them (see report_file).
+    """
+
+    def __init__(self, report_dir: Optional[str] = None):
+        self.report_dir = report_dir or tempfile.gettempdir()
+        self.session: Optional[ProfilingSession] = None
+        self._dump_task: Optional[asyncio.Task] = None
+
+    def report_path(self, session: ProfilingSession) -> str:
+        return os.path.join(
+            self.report_dir,
+            f"ooo_llm_bridge-profile-{os.getpid()}-{int(session.started)}.txt",
+        )
+
+    def start(
+        self, requests: Optional[int] = None, seconds: Optional[float] = None
+    ) -> ProfilingSession:
+        if self.session is not None and self.session.active:
+            raise RuntimeError("A profiling session is already running")
+        self.session = ProfilingSession(requests, seconds)
+        self.session.start()
+        self._dump_task = asyncio.get_running_loop().create_task(
+            self._dump_when_done(self.session)
+        )
+        logger.info(
+            f"Profiling started: requests={requests} seconds={seconds}, "
+            f"report in {self.report_path(self.session)}"
+        )
+        return self.session
+
+    def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Wrap callables submitted to a thread pool, e.g.
+        run_in_executor(pool, partial(profiler.run, fn, *args)): fn is
+        profiled when a session is running, and is just called otherwise.
+        """
+        session = self.session
+        if session is None:
+            return fn(*args, **kwargs)
+        return session.run(fn, *args, **kwargs)
+
+    @contextmanager
+    def track_request(self):
+        session = self.session
+        try:
+            yield
+        finally:
+            if session is not None and session.active:
+                session.request_done()
+
+    async def _dump_when_done(self, session: ProfilingSession) -> None:
+        """Writes the report of the session to a file once it stops."""
+        await session.done.wait()
+        report = session.report()
+        path = self.report_path(session)
+        with open(path, "w", encoding="utf8") as f:
+            for k, v in report.items():
+                if k not in ("stats", "blocking_calls"):
+                    f.write(f"{k}: {v}\n")
+            for b in report["blocking_calls"]:
+                f.write(f"\n--- blocked {b['count']} times in:\n{b['stack']}")
+            f.write("\n" + report["stats"])
+        logger.info(f"Profiling report written to {path}")
+
+    async def close(self) -> None:
+        """At shutdown: stops the running session and waits for its report."""
+        if self.session is not None:
+            self.session.stop()
+        if self._dump_task is not None:
+            await self._dump_task
+
+    def report_file(self, pid: Optional[int] = None) -> Optional[str]:
+        """Latest report written to report_dir, by any worker or by `pid`."""
+        prefix = "ooo_llm_bridge-profile-" + (f"{pid}-" if pid else "")
+        try:
+            names = [n for n in os.listdir(self.report_dir) if n.startswith(prefix)]
+        except FileNotFoundError:
+            return None
+        if not names:
+            return None
+        paths = [os.path.join(self.report_dir, n) for n in names]
+        return max(paths, key=os.path.getmtime)
@@ -0,0 +1,143 @@
+import json
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+from ooo_llm_bridge.config import get_config
+from ooo_llm_bridge.context.context import build_context
+from ooo_llm_bridge.logging_conf import text_fields
+from ooo_llm_bridge.metrics import Metrics
+from ooo_llm_bridge.models.message import ChatRequest
+from ooo_llm_bridge.routing import choose_route
+from ooo_llm_bridge.serialization import dumps_str
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewContext:
+    """Editorial context and system prompt sent with every review."""
+
+    def __init__(self, editorial_context: str, system_prompt: str):
+        self.editorial_context = editorial_context
+        self.system_prompt = system_prompt
+
+
+def load_review_context(context_path, system_prompt_path) -> ReviewContext:
+    """Called at startup (CONTEXT_PATH, SYSTEM_PROMPT_PATH), not at import."""
+    with open(context_path, "r", encoding="utf8") as f:
+        full_creative_context = json.load(f)
+
+    with open(system_prompt_path, "r", encoding="utf8") as f:
+        system_prompt = f.read()
+
+    return ReviewContext(
+        build_context(full_creative_context, mode="dialoghi"), system_prompt
+    )
+
+
+user_prompt_template_first = """
+CONTEXT FOR THE EDITOR:
+The following information may include background notes, stylistic constraints, worldbuilding details, tone guidelines, or other relevant instructions. Use this only as contextual knowledge.
+
+{context}
+
+TEXT TO REVIEW:
+{text}
+"""
+
+
+def request_mode(chat_request: ChatRequest) -> str:
+    return chat_request.mode or "dialoghi"
+
+
+def resolve_model(chat_request: ChatRequest) -> Tuple[str, str]:
+    """
+    Returns (model, route): the model forced by the client, if any,
+    otherwise the one picked from the model ladder.
+    """
+    if chat_request.model:
+        return chat_request.model, f"override:{chat_request.model}"
+    route = choose_route(
+        get_config().MODEL_LADDER, chat_request, request_mode(chat_request)
+    )
+    return route.model, route.model
+
+
+def build_messages(
+    context: ReviewContext, chat_request: ChatRequest
+) -> List[Dict[str, Any]]:
+    # un solo passaggio di serializzazione: i thread diventano oggetti dentro
+    # il payload (niente più JSON dentro JSON), il testo viene scritto una volta
+    user_payload = {
+        "editorial_context": context.editorial_context,
+        "section_text": chat_request.text,
+        "comment_threads": [
+            c.model_dump(mode="json") for c in chat_request.comment_threads
+        ],
+    }
+    return [
+        {"role": "system", "content": context.system_prompt},
+        {"role": "user", "content": dumps_str(user_payload)},
+    ]
+
+
+def run_review(
+    client: "OpenAI",
+    metrics: Metrics,
+    context: ReviewContext,
+    chat_request: ChatRequest,
+    lane: str = "interactive",
+) -> str:
+    """
+    Sends the section to the model and returns the raw reply (a JSON string).
+    Upstream errors are propagated to the caller.
+    """
+    mode = request_mode(chat_request)
+    model, route = resolve_model(chat_request)
+    if lane != "interactive":
+        route = f"{lane}/{route}"
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "Reviewing section uuid=%s mode=%s lane=%s, routed to %s",
+            chat_request.uuid,
+            mode,
+            lane,
+            route,
+            extra={
+                "uuid": chat_request.uuid,
+                "mode": mode,
+                "lane": lane,
+                "route": route,
+                "threads": len(chat_request.comment_threads),
+                **text_fields("text", chat_request.text),
+            },
+        )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Received comment_threads=%s",
+            [t.thread_id for t in chat_request.comment_threads],
+        )
+
+    start = time.perf_counter()
+    try:
+        completion = client.chat.completions.create(
+            model=model,
+            messages=build_messages(context, chat_request),
+            temperature=0.7,
+            response_format={"type": "json_object"},
+        )
+    except Exception:
+        metrics.observe_completion(route, time.perf_counter() - start, error=True)
+        raise
+
+    metrics.observe_completion(
+        route, time.perf_counter() - start, usage=completion.usage
+    )
+    reply = completion.choices[0].message.content
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Reply received", extra=text_fields("reply", reply))
+    return reply
@@ -0,0 +1,73 @@
+import os
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+
+from ooo_llm_bridge.config import get_config
+from ooo_llm_bridge.dependencies import get_profiler
+from ooo_llm_bridge.profiling import Profiler
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    token = get_config().ADMIN_TOKEN
+    # senza ADMIN_TOKEN gli endpoint di amministrazione non esistono
+    if not token:
+        raise HTTPException(status_code=404)
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, token):
+        raise HTTPException(status_code=403)
+
+
+admin_router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@admin_router.post(path="/profile", status_code=202)
+async def start_profile(
+    requests: Optional[int] = Query(default=None, gt=0),
+    seconds: Optional[float] = Query(default=None, gt=0),
+    profiler: Profiler = Depends(get_profiler),
+):
+    """
+    Profiles, in the worker that receives the call, its next `requests`
+    /ask requests or the next `seconds` seconds (whichever comes first;
+    30 seconds if neither is given). The report is also written to
+    PROFILE_REPORT_DIR.
+    """
+    if requests is None and seconds is None:
+        seconds = 30.0
+    try:
+        session = profiler.start(requests=requests, seconds=seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    return {
+        "status": "started",
+        "pid": os.getpid(),
+        "requests": requests,
+        "seconds": seconds,
+        "report": profiler.report_path(session),
+    }
+
+
+@admin_router.get(path="/profile")
+async def profile_report(
+    pid: Optional[int] = Query(default=None),
+    profiler: Profiler = Depends(get_profiler),
+):
+    """
+    Report of the last session of this worker (while it is running, only lag
+    and progress). With several workers the call may land on another one:
+    then the latest report file of `pid` (or of any worker) is returned.
+    """
+    if profiler.session is not None and pid in (None, os.getpid()):
+        return {
+            "pid": os.getpid(),
+            "path": profiler.report_path(profiler.session),
+            **profiler.session.report(),
+        }
+    path = profiler.report_file(pid)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No profiling report")
+    # ooo_llm_bridge-profile-<pid>-<started>.txt
+    worker = int(os.path.basename(path).split("-")[2])
+    with open(path, "r", encoding="utf8") as f:
+        return {"pid": worker, "active": False, "path": path, "report": f.read()}
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+health_router = APIRouter()
+
+
+@health_router.get(path="/ready")
+async def ready(request: Request):
+    """200 once the upstream connections are warmed up, 503 before."""
+    if request.app.state.ready:
+        return {"status": "ready"}
+    return JSONResponse(status_code=503, content={"status": "starting"})
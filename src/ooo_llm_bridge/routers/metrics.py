@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Depends
+
+from ooo_llm_bridge.dependencies import get_metrics
+from ooo_llm_bridge.metrics import Metrics
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get(path="/metrics")
+async def metrics(metrics: Metrics = Depends(get_metrics)):
+    return metrics.snapshot()
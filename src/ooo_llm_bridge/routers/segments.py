@@ -1,75 +1,139 @@
-import json
+import asyncio
 import logging
+import time
+from concurrent.futures import Executor
+from functools import partial
+from typing import TYPE_CHECKING, Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException
-from openai import OpenAI
 
-from ooo_llm_bridge.context.context import build_context
-from ooo_llm_bridge.dependencies import get_openai_client
-from ooo_llm_bridge.models.message import ChatRequest, ChatResponse
+from ooo_llm_bridge.config import get_config
+from ooo_llm_bridge.dependencies import (
+    chat_request_openapi,
+    get_chat_request,
+    get_metrics,
+    get_openai_client,
+    get_profiler,
+    get_rate_limiter,
+    get_review_context,
+    get_review_executor,
+    get_speculative_lane,
+    get_store,
+)
+from ooo_llm_bridge.metrics import Metrics
+from ooo_llm_bridge.models.message import ChatRequest, ChatResponse, PrefetchResponse
+from ooo_llm_bridge.profiling import Profiler
+from ooo_llm_bridge.review import ReviewContext, run_review
+from ooo_llm_bridge.serialization import FastJSONResponse
+from ooo_llm_bridge.shared_state import RateLimiter
+from ooo_llm_bridge.speculative import SpeculativeLane, request_key
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 logger = logging.getLogger(__name__)
 
-with open("data/full_context.json", "r", encoding="utf8") as f:
-    full_creative_context = json.load(f)
-
-dialog_context = build_context(full_creative_context, mode="dialoghi")
-
-with open("data/prompts/system.txt", "r", encoding="utf8") as f:
-    system_prompt_initial = f.read()
-
-
-user_prompt_template_first = """
-CONTEXT FOR THE EDITOR:
-The following information may include background notes, stylistic constraints, worldbuilding details, tone guidelines, or other relevant instructions. Use this only as contextual knowledge.
-
-{context}
-
-TEXT TO REVIEW:
-{text}
-"""
-
 
 ask_router = APIRouter()
 
 
-@ask_router.post(path="/ask")
-async def ask(
-    chat_request: ChatRequest,
+async def _wait_for_inflight(
+    store, key: str, timeout: float
+) -> Tuple[Optional[str], bool]:
+    """
+    The same request is being served elsewhere (another worker, or a double
+    click): waits for its reply. Returns (reply, False), or (None, True) when
+    the other request gave up and this one took over the claim.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.25)
+        reply = await store.call("cache_get", key)
+        if reply is not None:
+            return reply, False
+        if await store.call("claim", key, ttl=timeout):
+            return None, True
+    return None, False
+
+
+@ask_router.post(
+    path="/ask",
     response_model=ChatResponse,
-    client: OpenAI = Depends(get_openai_client),
+    response_class=FastJSONResponse,
+    openapi_extra=chat_request_openapi,
+)
+async def ask(
+    chat_request: ChatRequest = Depends(get_chat_request),
+    client: "OpenAI" = Depends(get_openai_client),
+    context: ReviewContext = Depends(get_review_context),
+    metrics: Metrics = Depends(get_metrics),
+    lane: SpeculativeLane = Depends(get_speculative_lane),
+    store=Depends(get_store),
+    rate_limiter: RateLimiter = Depends(get_rate_limiter),
+    profiler: Profiler = Depends(get_profiler),
+    review_executor: Executor = Depends(get_review_executor),
+):
+    config = get_config()
+
+    with profiler.track_request(), lane.interactive():
+        reply = await lane.take(chat_request)
+        if reply is None:
+            reply = await lane.wait_running(chat_request, config.UPSTREAM_READ_TIMEOUT)
+        if reply is not None:
+            logger.info(f"Serving pre-review for section uuid={chat_request.uuid}")
+            return FastJSONResponse({"reply": reply})
+
+        key = f"ask:{request_key(chat_request)}"
+        reply = await store.call("cache_get", key)
+        claimed = False
+        if reply is None:
+            claimed = await store.call("claim", key, ttl=config.UPSTREAM_READ_TIMEOUT)
+            if not claimed:
+                reply, claimed = await _wait_for_inflight(
+                    store, key, config.UPSTREAM_READ_TIMEOUT
+                )
+        if reply is not None:
+            logger.info(
+                f"Serving deduplicated reply for section uuid={chat_request.uuid}"
+            )
+            return FastJSONResponse({"reply": reply})
+
+        await lane.cancel(chat_request)
+        try:
+            if not await rate_limiter.acquire():
+                raise HTTPException(
+                    status_code=429, detail="Upstream quota exhausted, retry later"
+                )
+            try:
+                # in un thread: la chiamata upstream può durare minuti
+                reply = await asyncio.get_running_loop().run_in_executor(
+                    review_executor,
+                    partial(
+                        profiler.run, run_review, client, metrics, context, chat_request
+                    ),
+                )
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e)) from e
+            await store.call("cache_put", key, reply, ttl=config.DEDUP_TTL)
+        finally:
+            if claimed:
+                await store.call("release", key)
+
+        return FastJSONResponse({"reply": reply})
+
+
+@ask_router.post(
+    path="/prefetch",
+    status_code=202,
+    response_model=PrefetchResponse,
+    openapi_extra=chat_request_openapi,
+)
+async def prefetch(
+    chat_request: ChatRequest = Depends(get_chat_request),
+    lane: SpeculativeLane = Depends(get_speculative_lane),
 ):
-    mode = chat_request.mode or "dialoghi"
-    comment_threads = chat_request.comment_threads
-
-    logger.info(
-        f"Received request for section uuid={chat_request.uuid} and mode={mode}"
-    )
-    logger.debug(f"Received comment_threads={comment_threads}")
-    logger.info(chat_request.text)
-
-    user_payload = {
-        "editorial_context": dialog_context,
-        "section_text": chat_request.text,
-        "comment_threads": [c.model_dump_json() for c in chat_request.comment_threads],
-    }
-
-    try:
-        completion = client.chat.completions.create(
-            model=chat_request.model,
-            messages=[
-                {"role": "system", "content": system_prompt_initial},
-                {
-                    "role": "user",
-                    "content": json.dumps(user_payload, ensure_ascii=False),
-                },
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"},
-        )
-        reply = completion.choices[0].message.content
-        logger.info(reply)
-
-        return {"reply": reply}
-    except Exception as e:
-        raise HTTPException(status_code=500, details=str(e)) from e
+    """
+    Queues a low-priority review of the section: the reply is kept until
+    /ask is called with the same request, or the text changes.
+    """
+    return {"status": await lane.submit(chat_request)}
@@ -0,0 +1,57 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from ooo_llm_bridge.models.message import ChatRequest
+
+
+class ModelRoute(BaseModel):
+    """
+    One rung of the model ladder: the route is taken when the request fits
+    all the limits that are set (None = no limit).
+    """
+
+    model: str
+    max_input_tokens: Optional[int] = None
+    max_threads: Optional[int] = None
+    modes: Optional[List[str]] = None
+
+    def accepts(self, input_tokens: int, mode: str, n_threads: int) -> bool:
+        if self.max_input_tokens is not None and input_tokens > self.max_input_tokens:
+            return False
+        if self.max_threads is not None and n_threads > self.max_threads:
+            return False
+        if self.modes is not None and mode not in self.modes:
+            return False
+        return True
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 caratteri per token: abbastanza preciso per scegliere il modello
+    return len(text) // 4 + 1
+
+
+def estimate_input_tokens(chat_request: ChatRequest) -> int:
+    tokens = estimate_tokens(chat_request.text)
+    for thread in chat_request.comment_threads:
+        tokens += estimate_tokens(thread.anchor_snippet)
+        tokens += sum(estimate_tokens(a.content) for a in thread.annotations)
+    return tokens
+
+
+def choose_route(
+    ladder: List[ModelRoute], chat_request: ChatRequest, mode: str
+) -> ModelRoute:
+    """
+    Returns the first rung of the ladder accepting the request; the last rung
+    is the fallback for everything that does not fit the smaller ones.
+    """
+    if not ladder:
+        raise ValueError("Empty model ladder")
+
+    input_tokens = estimate_input_tokens(chat_request)
+    n_threads = len(chat_request.comment_threads)
+    for route in ladder:
+        if route.accepts(input_tokens, mode, n_threads):
+            return route
+    return ladder[-1]
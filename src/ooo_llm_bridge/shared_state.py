@@ -0,0 +1,405 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStore:
+    """
+    State of a single process: response cache, token buckets, in-flight
+    keys and job records. Same interface as SqliteStore, which shares them
+    between the workers.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._inflight: Dict[str, float] = {}
+        self._jobs: Dict[str, Tuple[Dict[str, Any], float]] = {}
+
+    # --- cache ---
+
+    def cache_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None or entry[1] < time.time():
+                return None
+            return entry[0]
+
+    def cache_put(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = (value, time.time() + ttl)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def cache_pop(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._cache.pop(key, None)
+            if entry is None or entry[1] < time.time():
+                return None
+            return entry[0]
+
+    # --- token bucket ---
+
+    def take_token(
+        self, bucket: str, rate: float, capacity: float, reserve: float = 0
+    ) -> float:
+        """
+        Takes one token, leaving at least `reserve` in the bucket: returns 0,
+        or the seconds to wait before retrying.
+        """
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(bucket, (capacity, now))
+            tokens, wait = _refill_and_take(
+                tokens, updated, now, rate, capacity, reserve
+            )
+            self._buckets[bucket] = (tokens, now)
+        return wait
+
+    # --- in-flight keys ---
+
+    def claim(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            if self._inflight.get(key, 0) > now:
+                return False
+            self._inflight[key] = now + ttl
+            return True
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    # --- jobs ---
+
+    def job_get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None or entry[1] < time.time():
+                return None
+            return entry[0]
+
+    def job_put(self, job_id: str, record: Dict[str, Any], ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            for expired in [k for k, (_, exp) in self._jobs.items() if exp < now]:
+                del self._jobs[expired]
+            self._jobs[job_id] = (record, now + ttl)
+
+    def job_update(
+        self,
+        job_id: str,
+        expected: Dict[str, Any],
+        record: Optional[Dict[str, Any]],
+        ttl: float = 0,
+    ) -> bool:
+        """
+        Compare-and-set: replaces the record (deletes it, with record=None)
+        only if it still has the `expected` values, e.g. same key and
+        status "queued".
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None or entry[1] < now or not _matches(entry[0], expected):
+                return False
+            if record is None:
+                del self._jobs[job_id]
+            else:
+                self._jobs[job_id] = (record, now + ttl)
+            return True
+
+    def job_delete(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    async def call(self, method: str, *args, **kwargs) -> Any:
+        """Async access for the event loop: in memory, nothing to wait for."""
+        return getattr(self, method)(*args, **kwargs)
+
+    def close(self) -> None:
+        pass
+
+
+def _matches(record: Dict[str, Any], expected: Dict[str, Any]) -> bool:
+    return all(record.get(k) == v for k, v in expected.items())
+
+
+def _refill_and_take(
+    tokens: float,
+    updated: float,
+    now: float,
+    rate: float,
+    capacity: float,
+    reserve: float = 0,
+) -> Tuple[float, float]:
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= 1 + reserve:
+        return tokens - 1, 0.0
+    return tokens, (1 + reserve - tokens) / rate
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL);
+CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL);
+CREATE TABLE IF NOT EXISTS inflight (key TEXT PRIMARY KEY, expires REAL);
+CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, record TEXT, expires REAL);
+"""
+
+
+class SqliteStore:
+    """
+    Shared state in a local SQLite database in WAL mode: every worker opens
+    the same file, readers never block the writer and the read-modify-write
+    operations run in BEGIN IMMEDIATE transactions.
+    """
+
+    def __init__(self, path: str, max_entries: int = 256):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=10.0, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        # le chiamate sono comunque serializzate da _lock: un solo thread,
+        # tutto suo, così non si mettono in coda dietro alle review
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="shared-state"
+        )
+        logger.info(f"Shared state in {path}")
+
+    def _write(self, fn):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    # --- cache ---
+
+    def cache_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires >= ?",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def cache_put(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+
+        def put(db):
+            db.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (key, value, now + ttl)
+            )
+            db.execute("DELETE FROM cache WHERE expires < ?", (now,))
+            db.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache"
+                " ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+        self._write(put)
+
+    def cache_pop(self, key: str) -> Optional[str]:
+        def pop(db):
+            row = db.execute(
+                "SELECT value, expires FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return row
+
+        row = self._write(pop)
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    # --- token bucket ---
+
+    def take_token(
+        self, bucket: str, rate: float, capacity: float, reserve: float = 0
+    ) -> float:
+        now = time.time()
+
+        def take(db):
+            row = db.execute(
+                "SELECT tokens, updated FROM buckets WHERE name = ?", (bucket,)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens, wait = _refill_and_take(
+                tokens, updated, now, rate, capacity, reserve
+            )
+            db.execute(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (bucket, tokens, now)
+            )
+            return wait
+
+        return self._write(take)
+
+    # --- in-flight keys ---
+
+    def claim(self, key: str, ttl: float) -> bool:
+        now = time.time()
+
+        def claim(db):
+            db.execute("DELETE FROM inflight WHERE key = ? AND expires < ?", (key, now))
+            cur = db.execute(
+                "INSERT OR IGNORE INTO inflight VALUES (?, ?)", (key, now + ttl)
+            )
+            return cur.rowcount == 1
+
+        return self._write(claim)
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM inflight WHERE key = ?", (key,))
+
+    # --- jobs ---
+
+    def job_get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT record FROM jobs WHERE id = ? AND expires >= ?",
+                (job_id, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def job_put(self, job_id: str, record: Dict[str, Any], ttl: float) -> None:
+        now = time.time()
+
+        def put(db):
+            db.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?)",
+                (job_id, json.dumps(record, ensure_ascii=False), now + ttl),
+            )
+            # record lasciati da un worker terminato a metà
+            db.execute("DELETE FROM jobs WHERE expires < ?", (now,))
+
+        self._write(put)
+
+    def job_update(
+        self,
+        job_id: str,
+        expected: Dict[str, Any],
+        record: Optional[Dict[str, Any]],
+        ttl: float = 0,
+    ) -> bool:
+        now = time.time()
+
+        def update(db):
+            row = db.execute(
+                "SELECT record FROM jobs WHERE id = ? AND expires >= ?", (job_id, now)
+            ).fetchone()
+            if row is None or not _matches(json.loads(row[0]), expected):
+                return False
+            if record is None:
+                db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                return True
+            db.execute(
+                "UPDATE jobs SET record = ?, expires = ? WHERE id = ?",
+                (json.dumps(record, ensure_ascii=False), now + ttl, job_id),
+            )
+            return True
+
+        return self._write(update)
+
+    def job_delete(self, job_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    async def call(self, method: str, *args, **kwargs) -> Any:
+        """
+        Async access for the event loop: the call runs in the store thread,
+        since a write can wait up to 10 s for the transaction of another worker.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(getattr(self, method), *args, **kwargs)
+        )
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._db.close()
+
+
+def create_store(config):
+    if config.SHARED_STATE_PATH:
+        return SqliteStore(
+            config.SHARED_STATE_PATH, max_entries=config.CACHE_MAX_ENTRIES
+        )
+    return MemoryStore(max_entries=config.CACHE_MAX_ENTRIES)
+
+
+class RateLimiter:
+    """
+    Token bucket on the upstream calls, `per_minute` requests with bursts of
+    `burst`. The bucket lives in the store, so the quota is shared by all the
+    processes using it. per_minute=None disables the limit.
+
+    Low-priority callers (pre-reviews) only take tokens above `reserve`:
+    the last ones are kept for interactive requests.
+    """
+
+    def __init__(
+        self,
+        store,
+        per_minute: Optional[float],
+        burst: int = 5,
+        max_wait: float = 30.0,
+        bucket: str = "upstream",
+        reserve: int = 0,
+    ):
+        self.store = store
+        self.rate = per_minute / 60 if per_minute else None
+        self.burst = burst
+        self.max_wait = max_wait
+        self.bucket = bucket
+        self.reserve = min(reserve, burst - 1)
+
+    async def acquire(
+        self, max_wait: Optional[float] = None, low_priority: bool = False
+    ) -> bool:
+        """
+        Waits for a token, for at most `max_wait` seconds (default: the
+        configured one). Returns False when the wait would be longer.
+        """
+        if self.rate is None:
+            return True
+        max_wait = self.max_wait if max_wait is None else max_wait
+        reserve = self.reserve if low_priority else 0
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = await self.store.call(
+                "take_token", self.bucket, self.rate, self.burst, reserve
+            )
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self) -> None:
+        """Waits as long as needed; for threads outside the event loop."""
+        if self.rate is None:
+            return
+        while (wait := self.store.take_token(self.bucket, self.rate, self.burst)) > 0:
+            time.sleep(wait)
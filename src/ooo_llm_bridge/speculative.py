@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from ooo_llm_bridge.models.message import ChatRequest
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(chat_request: ChatRequest) -> str:
+    """Hash of everything that affects the reply: same key → same review."""
+    return hashlib.sha256(
+        chat_request.model_dump_json(exclude={"uuid"}).encode("utf-8")
+    ).hexdigest()
+
+
+def segment_key(chat_request: ChatRequest) -> str:
+    # senza bookmark il segmento è identificato solo dal suo testo
+    return chat_request.uuid or f"text:{request_key(chat_request)}"
+
+
+class SpeculativeLane:
+    """
+    Low-priority lane for pre-reviews submitted by the macro (POST /prefetch).
+
+    - jobs are coalesced per segment: a newer submission for the same segment
+      replaces the pending one, and a result computed for an older text is
+      discarded;
+    - the worker starts a job only while no interactive request is in flight,
+      and runs it in `executor` (default: asyncio's) so the event loop stays
+      free;
+    - /ask takes the cached reply when its request has the same key as the
+      pre-review, otherwise the stale entry for that segment is dropped;
+      when that pre-review is still running /ask waits for it, and a queued
+      one is cancelled since /ask reviews the same request itself.
+
+    Results and job records live in the store, so with several workers the
+    pre-review computed by one of them is served by any other. Job records
+    expire after `job_ttl` seconds: those left by a worker that died are
+    forgotten, and a job still queued by then is dropped.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[ChatRequest], str],
+        store,
+        max_pending: int = 8,
+        ttl: float = 1800.0,
+        job_ttl: float = 600.0,
+        acquire: Optional[Callable[[], Awaitable[bool]]] = None,
+        executor: Optional[Executor] = None,
+    ):
+        self._run = run
+        self._executor = executor
+        self._store = store
+        self._acquire = acquire
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.job_ttl = job_ttl
+
+        # segment → request in attesa (solo in questo worker)
+        self._pending: "OrderedDict[str, ChatRequest]" = OrderedDict()
+
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._interactive = 0
+
+        self.stats = {
+            "submitted": 0,
+            "dropped": 0,
+            "hits": 0,
+            "joined": 0,
+            "stale": 0,
+            "cancelled": 0,
+            "errors": 0,
+        }
+
+    # --- interactive side ---
+
+    @contextmanager
+    def interactive(self):
+        """Wrap interactive requests: speculative jobs wait until none is in flight."""
+        self._interactive += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._interactive -= 1
+            if self._interactive == 0:
+                self._idle.set()
+
+    async def _pop(self, chat_request: ChatRequest) -> Optional[str]:
+        cached = await self._store.call(
+            "cache_pop", f"speculative:{segment_key(chat_request)}"
+        )
+        if cached is None:
+            return None
+
+        entry = json.loads(cached)
+        if entry["key"] != request_key(chat_request):
+            self.stats["stale"] += 1
+            return None
+        return entry["reply"]
+
+    async def take(self, chat_request: ChatRequest) -> Optional[str]:
+        """Pops the pre-computed reply for this exact request, if any."""
+        reply = await self._pop(chat_request)
+        if reply is not None:
+            self.stats["hits"] += 1
+        return reply
+
+    async def wait_running(
+        self, chat_request: ChatRequest, timeout: float
+    ) -> Optional[str]:
+        """
+        The pre-review of this exact request is running (here or in another
+        worker): waits for its reply instead of calling upstream again.
+        Returns None when there is no such job, or it failed or was replaced.
+        """
+        job_id = f"speculative:{segment_key(chat_request)}"
+        key = request_key(chat_request)
+
+        async def running() -> bool:
+            job = await self._store.call("job_get", job_id)
+            return job is not None and job["key"] == key and job["status"] == "running"
+
+        if not await running():
+            return None
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.25)
+            if await running():
+                continue
+            # finito (la risposta è in cache), fallito o sostituito
+            reply = await self._pop(chat_request)
+            if reply is not None:
+                self.stats["joined"] += 1
+            return reply
+        return None
+
+    async def cancel(self, chat_request: ChatRequest) -> None:
+        """
+        /ask is about to review this exact request: a queued pre-review of it
+        would only bill the same review twice.
+        """
+        # atomico rispetto al passaggio queued → running del worker, che
+        # salta i job che non trova più nello store
+        cancelled = await self._store.call(
+            "job_update",
+            f"speculative:{segment_key(chat_request)}",
+            {"key": request_key(chat_request), "status": "queued"},
+            None,
+        )
+        if cancelled:
+            self.stats["cancelled"] += 1
+
+    # --- speculative side ---
+
+    async def submit(self, chat_request: ChatRequest) -> str:
+        segment = segment_key(chat_request)
+        key = request_key(chat_request)
+
+        cached = await self._store.call("cache_get", f"speculative:{segment}")
+        if cached is not None and json.loads(cached)["key"] == key:
+            return "cached"
+        job = await self._store.call("job_get", f"speculative:{segment}")
+        # già in coda o in corso, in questo worker o in un altro
+        if job is not None and job["key"] == key:
+            return job["status"]
+
+        # il testo è cambiato: la vecchia pre-review non serve più
+        await self._store.call("cache_pop", f"speculative:{segment}")
+        await self._store.call(
+            "job_put",
+            f"speculative:{segment}",
+            {"key": key, "status": "queued", "submitted": time.time()},
+            ttl=self.job_ttl,
+        )
+
+        self.stats["submitted"] += 1
+        self._pending.pop(segment, None)
+        self._pending[segment] = chat_request
+        if len(self._pending) > self.max_pending:
+            dropped, _ = self._pending.popitem(last=False)
+            await self._store.call("job_delete", f"speculative:{dropped}")
+            self.stats["dropped"] += 1
+
+        self._wakeup.set()
+        return "queued"
+
+    async def _is_latest(self, segment: str, key: str) -> bool:
+        job = await self._store.call("job_get", f"speculative:{segment}")
+        return job is not None and job["key"] == key
+
+    async def _store_reply(self, segment: str, key: str, reply: str) -> None:
+        if not await self._is_latest(segment, key):
+            # il testo è cambiato mentre il modello lavorava
+            self.stats["stale"] += 1
+            return
+        # prima la risposta, poi il job: chi aspetta il job la trova già
+        await self._store.call(
+            "cache_put",
+            f"speculative:{segment}",
+            json.dumps({"key": key, "reply": reply}, ensure_ascii=False),
+            ttl=self.ttl,
+        )
+        await self._store.call("job_delete", f"speculative:{segment}")
+
+    async def run_forever(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while self._pending:
+                await self._idle.wait()
+                if not self._pending:
+                    break
+                segment, chat_request = self._pending.popitem(last=False)
+                key = request_key(chat_request)
+                if not await self._is_latest(segment, key):
+                    continue
+                if self._acquire is not None:
+                    await self._acquire()
+                    # l'attesa della quota può essere lunga: nel frattempo può
+                    # essere arrivata una /ask
+                    await self._idle.wait()
+
+                # queued → running in modo atomico: se /ask ha cancellato il job,
+                # o il testo è cambiato, non si parte
+                started = await self._store.call(
+                    "job_update",
+                    f"speculative:{segment}",
+                    {"key": key, "status": "queued"},
+                    {"key": key, "status": "running", "started": time.time()},
+                    ttl=self.job_ttl,
+                )
+                if not started:
+                    continue
+                try:
+                    reply = await asyncio.get_running_loop().run_in_executor(
+                        self._executor, self._run, chat_request
+                    )
+                except Exception:
+                    self.stats["errors"] += 1
+                    await self._store.call("job_delete", f"speculative:{segment}")
+                    logger.exception("Speculative review failed")
+                    continue
+                await self._store_reply(segment, key, reply)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {**self.stats, "pending": len(self._pending)}
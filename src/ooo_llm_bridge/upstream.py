@@ -0,0 +1,108 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from ooo_llm_bridge.cassette import CassetteClient
+
+# openai e httpx si importano solo quando serve il client: da soli valgono
+# più di metà del tempo di import dell'applicazione
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def build_http_client(config) -> "httpx.Client":
+    """HTTP transport for the OpenAI client, with the pool tuned from the config."""
+    import httpx
+    from openai import DefaultHttpxClient
+
+    return DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=config.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=config.UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=config.UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            config.UPSTREAM_READ_TIMEOUT,
+            connect=config.UPSTREAM_CONNECT_TIMEOUT,
+        ),
+        http2=config.UPSTREAM_HTTP2,
+    )
+
+
+def create_openai_client(config) -> Tuple[Any, Optional["httpx.Client"]]:
+    """
+    Returns (client, http_client) according to CASSETTE_MODE: the OpenAI
+    client on the tuned transport, wrapped by the cassette when recording;
+    in replay mode only the cassette and no transport at all.
+    """
+    if config.CASSETTE_MODE == "replay":
+        client = CassetteClient(
+            config.CASSETTE_PATH, mode="replay", speed=config.CASSETTE_SPEED
+        )
+        logger.info(f"Replaying upstream completions from {config.CASSETTE_PATH}")
+        return client, None
+
+    from openai import OpenAI
+
+    http_client = build_http_client(config)
+    client = OpenAI(
+        api_key=config.OPENAPI_KEY,
+        base_url=config.UPSTREAM_BASE_URL,
+        http_client=http_client,
+    )
+    logger.info("OpenAI client initialized")
+
+    if config.CASSETTE_MODE == "record":
+        client = CassetteClient(config.CASSETTE_PATH, mode="record", client=client)
+        logger.info(f"Recording upstream completions to {config.CASSETTE_PATH}")
+
+    return client, http_client
+
+
+def warm_up(http_client: "httpx.Client", url: str, connections: int) -> int:
+    """
+    Opens up to `connections` pooled connections to the upstream host
+    (DNS + TCP + TLS), with concurrent unauthenticated HEAD requests:
+    the status code does not matter, only the connection kept alive.
+    With HTTP/2 the requests are multiplexed, so one connection is enough.
+
+    Returns the number of requests that reached the server.
+    """
+    if connections <= 0:
+        return 0
+
+    import httpx
+
+    def touch(_):
+        try:
+            http_client.head(url)
+            return True
+        except httpx.HTTPError as e:
+            logger.warning(f"Upstream warm-up request failed: {e!r}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        return sum(pool.map(touch, range(connections)))
+
+
+def pool_stats(http_client: "httpx.Client") -> Dict[str, Any]:
+    # httpx non espone il pool: si legge quello di httpcore, se c'è
+    # (campi privati: se una versione li rinomina il gauge resta vuoto)
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    if pool is None:
+        return {}
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for c in connections if c.is_idle())
+    stats = {
+        "connections": len(connections),
+        "idle": idle,
+        "active": len(connections) - idle,
+    }
+    requests = getattr(pool, "_requests", None)
+    if requests is not None:
+        stats["queued_requests"] = sum(
+            1 for r in requests if getattr(r, "connection", None) is None
+        )
+    return stats